@@ -1,46 +1,413 @@
 # File: app.py
-from flask import Flask, request, jsonify, send_file
+from flask import Flask, request, jsonify, send_file, Response, stream_with_context
+from flask.json.provider import DefaultJSONProvider
 from flask_cors import CORS
 import yt_dlp
+from yt_dlp.networking import Request
+from yt_dlp.networking.exceptions import HTTPError
+from cachetools import TTLCache
+import orjson
 import tempfile
 import os
 import threading
+import atexit
+import sched
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+import queue
+from concurrent.futures import ThreadPoolExecutor
 import time
-from pathlib import Path
 import shutil
+import re
+import logging
+import mimetypes
+from urllib.parse import quote
+
+class OrjsonProvider(DefaultJSONProvider):
+    """Serialize JSON with orjson, responses are built straight from its bytes"""
+    
+    def dumps(self, obj, **kwargs):
+        return orjson.dumps(obj, default=self.default).decode()
+    
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+    
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        return self._app.response_class(orjson.dumps(obj, default=self.default), mimetype=self.mimetype)
 
 app = Flask(__name__)
+app.json = OrjsonProvider(app)
 CORS(app)
 
+# Logging, quiet by default so hot paths skip formatting and stdout writes
+logging.basicConfig(level=os.environ.get('LOG_LEVEL', 'WARNING').upper())
+logger = logging.getLogger("ytdl_api")
+
 # Configuration
 MAX_FILE_SIZE = int(os.environ.get('MAX_FILE_SIZE', 100)) * 1024 * 1024  # Default 100MB
 CLEANUP_INTERVAL = int(os.environ.get('CLEANUP_INTERVAL', 300))  # Default 5 minutes
+IDLE_SWEEP_INTERVAL = CLEANUP_INTERVAL * 6  # Idle sweeper wakeup to catch files left by other workers
+STREAM_BLOCK_SIZE = 256 * 1024  # Bytes read from the source per yielded chunk
+FRAGMENT_WORKERS = int(os.environ.get('YT_FRAGS', 4))  # Parallel fragment fetches for DASH/HLS formats
+# Ranged request size override, like yt-dlp it wins over the extractor's own (10 MiB on YouTube)
+HTTP_CHUNK_SIZE = int(os.environ['YT_CHUNK']) if os.environ.get('YT_CHUNK') else None
+SENDFILE_BACKEND = os.environ.get('SENDFILE_BACKEND', '').lower()  # 'nginx', 'apache' or empty to serve from Python
+ACCEL_REDIRECT_PREFIX = os.environ.get('ACCEL_REDIRECT_PREFIX', '/protected/')  # nginx internal location aliased to the temp dir
+
+# Scratch space for yt-dlp fragments and ffmpeg merges, RAM-backed when /dev/shm exists
+MERGE_TEMP_DIR = os.environ.get('YT_TEMP') or (
+    '/dev/shm/yt_merge' if os.path.isdir('/dev/shm') else os.path.join(tempfile.gettempdir(), 'yt_merge')
+)
+os.makedirs(MERGE_TEMP_DIR, exist_ok=True)
+
+INFO_CACHE_SIZE = int(os.environ.get('INFO_CACHE_SIZE', 128))  # Videos kept in the info cache
+INFO_CACHE_TTL = int(os.environ.get('INFO_CACHE_TTL', 300))  # Default 5 minutes
+INFO_YDL_POOL_SIZE = int(os.environ.get('INFO_WORKERS', 2))  # Concurrent metadata extractions per process
+
+# Bounded pool for yt-dlp runs, caps concurrent downloads per process
+DL_POOL = ThreadPoolExecutor(max_workers=int(os.environ.get('DL_WORKERS', 4)), thread_name_prefix='download')
+
+# Delayed removal of served downloads, run by a single scheduler thread
+CLEANUP_SCHEDULER = sched.scheduler(time.monotonic, time.sleep)
+_cleanup_scheduled = threading.Event()
+
+# Apache (mod_xsendfile) is handled natively by Flask's send_file
+app.config['USE_X_SENDFILE'] = SENDFILE_BACKEND == 'apache'
+
+# Held by the one process that sweeps the temp dir, see acquire_cleanup_lock
+CLEANUP_LOCK_PATH = os.path.join(tempfile.gettempdir(), '.ytdl_cleanup.lock')
+
+# Cleanup thread coordination: _dirty is set whenever temp files may need pruning
+_stop = threading.Event()
+_dirty = threading.Event()
+_dirty.set()  # Sweep leftovers from a previous run once on startup
+
+def temp_dirs_changed(since):
+    """Check whether the shared temp dirs were modified after a timestamp"""
+    for path in (tempfile.gettempdir(), MERGE_TEMP_DIR):
+        try:
+            if os.stat(path).st_mtime > since:
+                return True
+        except OSError:
+            return True
+    return False
 
 def cleanup_old_files():
     """Clean up old temporary files"""
-    while True:
+    last_sweep = 0
+    while not _stop.is_set():
+        # Local downloads wake the sweeper right away. Other workers can't set _dirty,
+        # so the timeout picks up their leftovers through the temp dirs' mtime.
+        if not _dirty.wait(IDLE_SWEEP_INTERVAL) and not temp_dirs_changed(last_sweep):
+            continue
+        if _stop.wait(CLEANUP_INTERVAL):
+            break
+        _dirty.clear()
+        
         try:
-            temp_dir = Path(tempfile.gettempdir())
             current_time = time.time()
+            last_sweep = current_time
+            pending = False
             
-            # Clean up old yt_download directories
-            for dir_path in temp_dir.glob("yt_download_*"):
-                if dir_path.is_dir() and current_time - dir_path.stat().st_mtime > 3600:  # 1 hour
-                    shutil.rmtree(dir_path, ignore_errors=True)
+            # Single pass over the temp dir, DirEntry caches the type lookups
+            with os.scandir(tempfile.gettempdir()) as entries:
+                for entry in entries:
+                    # Old yt_download directories and individual temp files
+                    if entry.name.startswith("yt_download_"):
+                        is_dir = True
+                        if not entry.is_dir(follow_symlinks=False):
+                            continue
+                    elif entry.name.startswith("tmp"):
+                        is_dir = False
+                        if not entry.is_file(follow_symlinks=False):
+                            continue
+                    else:
+                        continue
                     
-            # Clean up individual temp files
-            for file_path in temp_dir.glob("tmp*"):
-                if file_path.is_file() and current_time - file_path.stat().st_mtime > 3600:
-                    file_path.unlink(missing_ok=True)
+                    if current_time - entry.stat(follow_symlinks=False).st_mtime <= 3600:  # 1 hour
+                        pending = True
+                    elif is_dir:
+                        shutil.rmtree(entry.path, ignore_errors=True)
+                    else:
+                        try:
+                            os.unlink(entry.path)
+                        except FileNotFoundError:
+                            pass
+            
+            # Clean up merge scratch left behind by interrupted downloads
+            with os.scandir(MERGE_TEMP_DIR) as entries:
+                for entry in entries:
+                    if current_time - entry.stat(follow_symlinks=False).st_mtime <= 3600:
+                        pending = True
+                    elif entry.is_dir(follow_symlinks=False):
+                        shutil.rmtree(entry.path, ignore_errors=True)
+                    else:
+                        try:
+                            os.unlink(entry.path)
+                        except FileNotFoundError:
+                            pass
+            
+            # Keep sweeping while anything is still too young to delete
+            if pending:
+                _dirty.set()
                     
         except Exception as e:
-            print(f"Cleanup error: {e}")
-        
-        time.sleep(CLEANUP_INTERVAL)
+            logger.error("Cleanup error: %s", e)
+            _dirty.set()
+
+def count_temp_downloads():
+    """Count yt_download directories currently in the temp dir"""
+    with os.scandir(tempfile.gettempdir()) as entries:
+        return sum(1 for entry in entries if entry.name.startswith("yt_download_"))
+
+def stop_cleanup():
+    """Wake the cleanup thread so it exits on shutdown"""
+    _stop.set()
+    _dirty.set()
+
+atexit.register(stop_cleanup)
+
+# MIME types for the containers yt-dlp produces, mimetypes covers the rest
+MIME_TYPES = {
+    '.mp3': 'audio/mpeg',
+    '.mp4': 'video/mp4',
+    '.webm': 'video/webm',
+    '.m4a': 'audio/mp4',
+    '.ogg': 'audio/ogg',
+    '.mkv': 'video/x-matroska',
+    '.opus': 'audio/ogg',
+}
+
+# Metadata cache shared by all endpoints, keyed by video ID
+INFO_CACHE = TTLCache(maxsize=INFO_CACHE_SIZE, ttl=INFO_CACHE_TTL)
+INFO_CACHE_LOCK = threading.Lock()
+
+# Accepted YouTube links, anchored so the host can't be smuggled into a query string
+YOUTUBE_URL_RE = re.compile(
+    r'^https?://(?:www\.|m\.|music\.)?(?:youtube\.com/(?:watch|shorts|embed|live)|youtu\.be/)',
+    re.IGNORECASE
+)
+VIDEO_ID_RE = re.compile(r'(?:[?&]v=|youtu\.be/|/shorts/|/embed/|/live/)([0-9A-Za-z_-]{11})')
+
+# yt-dlp options for info extraction only
+INFO_YDL_OPTS = {
+    'quiet': True,
+    'no_warnings': True,
+    'extract_flat': False,
+    'noplaylist': True,  # watch?v=ID&list=... must resolve to the video, it's cached under ID
+}
+
+# Long-lived info extractors, each borrowed by one request at a time since YoutubeDL isn't thread-safe
+INFO_YDL_POOL = queue.Queue()
+for _ in range(INFO_YDL_POOL_SIZE):
+    INFO_YDL_POOL.put(yt_dlp.YoutubeDL(dict(INFO_YDL_OPTS)))  # YoutubeDL normalizes its params in place
+
+def normalize_url(url):
+    """Reduce a YouTube URL to its video ID so equivalent links share a cache entry"""
+    match = VIDEO_ID_RE.search(url)
+    return match.group(1) if match else url
+
+def extract_video_info(url):
+    """Fetch video metadata, served from the TTL cache when available"""
+    key = normalize_url(url)
+    with INFO_CACHE_LOCK:
+        info = INFO_CACHE.get(key)
+    if info is not None:
+        return info
+    
+    ydl = INFO_YDL_POOL.get()
+    try:
+        info = ydl.extract_info(url, download=False)
+    finally:
+        INFO_YDL_POOL.put(ydl)
+    
+    # Only single videos may share the bare-ID key
+    if info.get('_type', 'video') == 'video':
+        with INFO_CACHE_LOCK:
+            INFO_CACHE[key] = info
+    return info
+
+def content_disposition(filename):
+    """Build an attachment header that survives non-ASCII titles"""
+    fallback = filename.encode('ascii', 'ignore').decode('ascii').replace('"', '') or 'download'
+    return f"attachment; filename=\"{fallback}\"; filename*=UTF-8''{quote(filename)}"
+
+def guess_mimetype(filename):
+    """Determine MIME type from the file extension"""
+    ext = os.path.splitext(filename)[1].lower()
+    return MIME_TYPES.get(ext) or mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+
+def drop_page_cache(path):
+    """Ask the kernel to evict a served file's pages, where posix_fadvise exists"""
+    if not hasattr(os, 'posix_fadvise'):
+        return
+    try:
+        fd = os.open(path, os.O_RDONLY)
+    except OSError:
+        return  # Already cleaned up
+    try:
+        os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_DONTNEED)
+    except OSError as e:
+        logger.debug("posix_fadvise failed for %s: %s", path, e)
+    finally:
+        os.close(fd)
+
+def evict_after_send(response, path):
+    """Drop a served file from the page cache once the server closes the body"""
+    # call_on_close doesn't fire for direct passthrough bodies, so hook the body's own
+    # close, which keeps the server's file_wrapper and its sendfile(2) fast path intact
+    body = response.response
+    close = getattr(body, 'close', None)
+    
+    def close_and_evict():
+        try:
+            if close:
+                close()
+        finally:
+            drop_page_cache(path)
+    
+    try:
+        body.close = close_and_evict
+    except AttributeError:
+        pass  # Empty bodies (HEAD, 304) hold no file
+
+def can_stream(info):
+    """Single-file HTTP formats can be piped straight to the client"""
+    return (
+        not info.get('requested_formats')
+        and info.get('protocol') in ('http', 'https')
+        and bool(info.get('url'))
+    )
+
+def stream_media(ydl, info):
+    """Open the selected format on YouTube and return a generator of its bytes"""
+    headers = dict(info.get('http_headers') or {})
+    # Same precedence as yt-dlp's HttpFD: explicit option first, then the extractor's value
+    chunk_size = ydl.params.get('http_chunk_size') or (info.get('downloader_options') or {}).get('http_chunk_size')
+    filesize = info.get('filesize')
+
+    def open_range(start):
+        # Fetch in ranged chunks like yt-dlp does, YouTube throttles long single reads
+        if chunk_size:
+            headers['Range'] = f'bytes={start}-{start + chunk_size - 1}'
+        return ydl.urlopen(Request(info['url'], headers=headers))
+
+    # Opened before the response starts so upstream failures still get a proper error status
+    first = open_range(0)
+
+    def generate():
+        source = first
+        sent = 0
+        try:
+            while True:
+                received = 0
+                with source:
+                    while True:
+                        block = source.read(STREAM_BLOCK_SIZE)
+                        if not block:
+                            break
+                        received += len(block)
+                        sent += len(block)
+                        if sent > MAX_FILE_SIZE:
+                            raise yt_dlp.DownloadError(f"Stream exceeded max size: {info.get('webpage_url')}")
+                        yield block
+                if not chunk_size or received < chunk_size or (filesize and sent >= filesize):
+                    break
+                try:
+                    source = open_range(sent)
+                except HTTPError as e:
+                    # Length unknown and an exact multiple of chunk_size, the last range already hit EOF
+                    if e.status == 416:
+                        break
+                    raise
+            logger.info("Streamed %.2f MB for: %s", sent / 1024 / 1024, info.get('webpage_url'))
+        except Exception as e:
+            # Re-raise so the server drops the connection instead of ending a truncated body cleanly
+            logger.error("Stream error after %d bytes: %s", sent, e)
+            raise
+        finally:
+            ydl.close()
+
+    return generate()
+
+def size_capped(format_spec):
+    """Prefer alternatives known to fit MAX_FILE_SIZE, then fall back to the plain spec"""
+    # '<=?' lets formats without a known size through, yt-dlp still ranks them by its own preferences
+    cap = f'[filesize<=?{MAX_FILE_SIZE}][filesize_approx<=?{MAX_FILE_SIZE}]'
+    return '/'.join([alternative + cap for alternative in format_spec.split('/')] + [format_spec])
+
+def selected_size(info):
+    """Known size of the selected format(s), or None if any part is unsized"""
+    total = 0
+    for fmt in info.get('requested_formats') or (info,):
+        size = fmt.get('filesize') or fmt.get('filesize_approx')
+        if not size:
+            return None
+        total += size
+    return total
+
+def select_format(ydl, info):
+    """Resolve the requested format from cached metadata without fetching any media"""
+    # Re-process the cached metadata instead of extracting again, like --load-info-json
+    return ydl.process_ie_result(ydl.sanitize_info(info, remove_private_keys=True), download=False)
+
+def run_scheduled_cleanups():
+    """Run delayed cleanups as they come due, idling while none are queued"""
+    while True:
+        _cleanup_scheduled.wait()
+        _cleanup_scheduled.clear()
+        # Every job uses the same delay, so new ones never need to run before a pending one
+        CLEANUP_SCHEDULER.run()
+
+def schedule_cleanup(temp_dir, delay=60):
+    """Remove a served download directory after delay seconds"""
+    CLEANUP_SCHEDULER.enter(delay, 0, cleanup_later, (temp_dir,))
+    _cleanup_scheduled.set()
+
+def cleanup_later(temp_dir):
+    """Remove a served download directory"""
+    try:
+        shutil.rmtree(temp_dir, ignore_errors=True)
+        logger.info("Cleaned up temp directory: %s", temp_dir)
+    except Exception as e:
+        logger.error("Cleanup failed for %s: %s", temp_dir, e)
+
+_threads_started = False
+_threads_lock = threading.Lock()
+_cleanup_lock_file = None
 
-# Start cleanup thread
-cleanup_thread = threading.Thread(target=cleanup_old_files, daemon=True)
-cleanup_thread.start()
+def acquire_cleanup_lock():
+    """Take the host-wide temp dir sweeper lock, held until this process exits"""
+    global _cleanup_lock_file
+    if fcntl is None:
+        return True  # No flock on this platform, every process sweeps
+    lock_file = open(CLEANUP_LOCK_PATH, 'w')
+    try:
+        fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except BlockingIOError:
+        lock_file.close()
+        return False
+    _cleanup_lock_file = lock_file
+    return True
+
+def start_cleanup_threads():
+    """Start the background cleanup threads once per process"""
+    global _threads_started
+    with _threads_lock:
+        if _threads_started:
+            return
+        _threads_started = True
+    # Delayed cleanups are queued per process, so every worker runs its own scheduler
+    threading.Thread(target=run_scheduled_cleanups, daemon=True).start()
+    # The temp dir is shared, one sweeper per host is enough
+    if acquire_cleanup_lock():
+        threading.Thread(target=cleanup_old_files, daemon=True).start()
+
+# Start cleanup threads
+start_cleanup_threads()
 
 @app.route('/', methods=['GET'])
 def home():
@@ -51,7 +418,7 @@ def home():
             "GET /": "API information",
             "GET /health": "Health check",
             "POST /api/video-info": "Get video information",
-            "POST /api/download": "Download video/audio",
+            "GET|POST /api/download": "Download video/audio",
             "POST /api/formats": "Get available formats"
         },
         "usage": {
@@ -60,7 +427,8 @@ def home():
                 "body": {"url": "youtube_url"}
             },
             "download": {
-                "method": "POST", 
+                "method": "GET|POST",
+                "note": "GET takes the same fields as query parameters",
                 "body": {"url": "youtube_url", "type": "video|audio", "quality": "best|720p|480p|360p|worst"}
             }
         }
@@ -72,7 +440,7 @@ def health():
         "status": "healthy", 
         "timestamp": time.time(),
         "uptime": time.time() - start_time,
-        "temp_files": len(list(Path(tempfile.gettempdir()).glob("yt_download_*")))
+        "temp_files": count_temp_downloads()
     })
 
 @app.route('/api/video-info', methods=['POST'])
@@ -87,53 +455,49 @@ def get_video_info():
             return jsonify({"error": "URL is required"}), 400
         
         # Validate URL format
-        if not ('youtube.com' in url or 'youtu.be' in url):
+        if not YOUTUBE_URL_RE.match(url):
             return jsonify({"error": "Please provide a valid YouTube URL"}), 400
         
-        print(f"Getting info for: {url}")
+        logger.info("Getting info for: %s", url)
         
-        # Configure yt-dlp for info extraction only
-        ydl_opts = {
-            'quiet': True,
-            'no_warnings': True,
-            'extract_flat': False,
-            'force_json': True,
-        }
+        info = extract_video_info(url)
         
-        with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-            info = ydl.extract_info(url, download=False)
-            
-            # Extract and clean relevant info
-            video_info = {
-                'title': info.get('title', 'Unknown').strip(),
-                'duration': info.get('duration', 0),
-                'uploader': info.get('uploader', 'Unknown').strip(),
-                'view_count': info.get('view_count'),
-                'description': (info.get('description', '')[:200] + '...') if info.get('description') else '',
-                'thumbnail': info.get('thumbnail'),
-                'upload_date': info.get('upload_date'),
-                'formats_available': len(info.get('formats', [])),
-                'id': info.get('id', ''),
-                'webpage_url': info.get('webpage_url', url)
-            }
+        # Extract and clean relevant info
+        video_info = {
+            'title': info.get('title', 'Unknown').strip(),
+            'duration': info.get('duration', 0),
+            'uploader': info.get('uploader', 'Unknown').strip(),
+            'view_count': info.get('view_count'),
+            'description': (info.get('description', '')[:200] + '...') if info.get('description') else '',
+            'thumbnail': info.get('thumbnail'),
+            'upload_date': info.get('upload_date'),
+            'formats_available': len(info.get('formats', [])),
+            'id': info.get('id', ''),
+            'webpage_url': info.get('webpage_url', url)
+        }
         
-        print(f"Successfully extracted info for: {video_info['title']}")
+        logger.info("Successfully extracted info for: %s", video_info['title'])
         return jsonify(video_info)
         
     except yt_dlp.DownloadError as e:
         error_msg = str(e)
-        print(f"yt-dlp error: {error_msg}")
+        logger.warning("yt-dlp error: %s", error_msg)
         return jsonify({"error": f"Video extraction failed: {error_msg}"}), 400
     except Exception as e:
         error_msg = str(e)
-        print(f"Unexpected error: {error_msg}")
+        logger.error("Unexpected error: %s", error_msg)
         return jsonify({"error": f"Server error: {error_msg}"}), 500
 
-@app.route('/api/download', methods=['POST'])
+@app.route('/api/download', methods=['GET', 'POST'])
 def download_video():
+    # Flask answers HEAD through GET routes, but headers here are only known after a download
+    if request.method == 'HEAD':
+        return Response(status=405, headers={'Allow': 'GET, POST'})
+    
     temp_dir = None
     try:
-        data = request.get_json()
+        # GET takes query parameters so browsers can download, show progress and resume via a plain link
+        data = request.args.to_dict() if request.method == 'GET' else request.get_json()
         if not data:
             return jsonify({"error": "No JSON data provided"}), 400
             
@@ -145,27 +509,29 @@ def download_video():
             return jsonify({"error": "URL is required"}), 400
         
         # Validate URL format
-        if not ('youtube.com' in url or 'youtu.be' in url):
+        if not YOUTUBE_URL_RE.match(url):
             return jsonify({"error": "Please provide a valid YouTube URL"}), 400
         
-        print(f"Downloading {download_type} from: {url} (quality: {quality})")
+        logger.info("Downloading %s from: %s (quality: %s)", download_type, url, quality)
         
-        # Create unique temporary directory
-        temp_dir = tempfile.mkdtemp(prefix="yt_download_")
-        print(f"Using temp directory: {temp_dir}")
+        # Cached metadata, the format is selected from it without extracting again
+        info = extract_video_info(url)
         
         # Configure yt-dlp options
         if download_type == 'audio':
             ydl_opts = {
                 'format': 'bestaudio/best',
-                'outtmpl': os.path.join(temp_dir, '%(title)s.%(ext)s'),
+                'outtmpl': '%(title)s.%(ext)s',
+                # 'best' copies the source stream (AAC, Opus, Vorbis, MP3) into a matching
+                # container, only codecs without one get re-encoded
                 'postprocessors': [{
                     'key': 'FFmpegExtractAudio',
-                    'preferredcodec': 'mp3',
-                    'preferredquality': '192',
+                    'preferredcodec': 'best',
+                    'nopostoverwrites': True,
                 }],
                 'quiet': True,
                 'no_warnings': True,
+                'noprogress': True,
             }
         else:
             # Map quality options with file size limits
@@ -179,76 +545,139 @@ def download_video():
             
             ydl_opts = {
                 'format': quality_map.get(quality, 'best[filesize<100M]/best'),
-                'outtmpl': os.path.join(temp_dir, '%(title)s.%(ext)s'),
+                'outtmpl': '%(title)s.%(ext)s',
                 'quiet': True,
                 'no_warnings': True,
+                'noprogress': True,
             }
         
-        # Download the video/audio
-        with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-            info = ydl.extract_info(url, download=True)
+        # Fragment and chunk tuning shared by both download types
+        ydl_opts.update({
+            'concurrent_fragment_downloads': FRAGMENT_WORKERS,
+            'buffersize': 1024 * 1024,
+        })
+        if HTTP_CHUNK_SIZE:
+            ydl_opts['http_chunk_size'] = HTTP_CHUNK_SIZE
+        
+        # Let yt-dlp's own ranking choose among formats that fit the size limit
+        ydl_opts['format'] = size_capped(ydl_opts['format'])
+        
+        ydl = yt_dlp.YoutubeDL(ydl_opts)
+        streaming = False
+        scratch_dir = None
+        try:
+            info = select_format(ydl, info)
             
-        # Find the downloaded file
-        downloaded_files = [f for f in os.listdir(temp_dir) if os.path.isfile(os.path.join(temp_dir, f))]
+            # Reject before any media is fetched when the chosen format is known to be too large
+            filesize = selected_size(info)
+            if filesize and filesize > MAX_FILE_SIZE:
+                return jsonify({
+                    "error": f"File too large ({filesize / 1024 / 1024:.1f}MB). Max allowed: {MAX_FILE_SIZE / 1024 / 1024}MB"
+                }), 413
+
+            # Progressive video formats go straight to the client, no disk round trip
+            if download_type != 'audio' and can_stream(info):
+                filename = os.path.basename(ydl.prepare_filename(info))
+                logger.info("Streaming file: %s", filename)
+
+                headers = {'Content-Disposition': content_disposition(filename)}
+                if info.get('filesize'):
+                    headers['Content-Length'] = str(info['filesize'])
+
+                body = stream_media(ydl, info)
+                streaming = True  # the generator closes ydl once the client is done
+                return Response(
+                    stream_with_context(body),
+                    mimetype=guess_mimetype(filename),
+                    headers=headers
+                )
+
+            # Merged formats and audio extraction need ffmpeg, so fall back to disk
+            temp_dir = tempfile.mkdtemp(prefix="yt_download_")
+            logger.debug("Using temp directory: %s", temp_dir)
+            if SENDFILE_BACKEND:
+                # mkdtemp creates 0700, the proxy runs as another user and has to traverse it
+                os.chmod(temp_dir, 0o755)
+            
+            # Per-request merge scratch so concurrent downloads of one video don't collide
+            scratch_dir = os.path.join(MERGE_TEMP_DIR, os.path.basename(temp_dir))
+            ydl.params['paths'] = {'home': temp_dir, 'temp': scratch_dir}
+            
+            # Run yt-dlp on the shared pool to cap concurrent downloads per process
+            info = DL_POOL.submit(ydl.process_ie_result, info, download=True).result()
+        finally:
+            if not streaming:
+                ydl.close()
+            if scratch_dir:
+                shutil.rmtree(scratch_dir, ignore_errors=True)
+
+        # yt-dlp reports the final path after merging, post-processing and moving
+        requested_downloads = info.get('requested_downloads') or ()
+        file_path = requested_downloads[-1].get('filepath') if requested_downloads else None
         
-        if not downloaded_files:
-            return jsonify({"error": "No file was downloaded. The video might be unavailable or too large."}), 500
+        # Check file size, a single stat also confirms the file exists
+        try:
+            file_size = os.stat(file_path).st_size if file_path else None
+        except FileNotFoundError:
+            file_size = None
         
-        # Get the largest file (main download)
-        file_sizes = [(f, os.path.getsize(os.path.join(temp_dir, f))) for f in downloaded_files]
-        file_sizes.sort(key=lambda x: x[1], reverse=True)
-        filename = file_sizes[0][0]
-        file_path = os.path.join(temp_dir, filename)
+        if file_size is None:
+            shutil.rmtree(temp_dir, ignore_errors=True)
+            return jsonify({"error": "No file was downloaded. The video might be unavailable or too large."}), 500
         
-        # Check file size
-        file_size = os.path.getsize(file_path)
-        print(f"Downloaded file: {filename} ({file_size / 1024 / 1024:.2f} MB)")
+        filename = os.path.basename(file_path)
+        logger.info("Downloaded file: %s (%.2f MB)", filename, file_size / 1024 / 1024)
         
         if file_size > MAX_FILE_SIZE:
+            # Remove rejected files now, the temp dir sweeper may live in another worker
+            shutil.rmtree(temp_dir, ignore_errors=True)
             return jsonify({
                 "error": f"File too large ({file_size / 1024 / 1024:.1f}MB). Max allowed: {MAX_FILE_SIZE / 1024 / 1024}MB"
             }), 413
         
-        # Determine MIME type
-        if filename.endswith('.mp3'):
-            mimetype = 'audio/mpeg'
-        elif filename.endswith('.mp4'):
-            mimetype = 'video/mp4'
-        elif filename.endswith('.webm'):
-            mimetype = 'video/webm'
-        else:
-            mimetype = 'application/octet-stream'
+        mimetype = guess_mimetype(filename)
+        
+        logger.info("Sending file: %s", filename)
         
-        print(f"Sending file: {filename}")
+        # Send file and schedule cleanup in 1 minute
+        schedule_cleanup(temp_dir)
+        _dirty.set()
         
-        # Send file and schedule cleanup
-        def cleanup_later():
-            time.sleep(60)  # Wait 1 minute
-            try:
-                shutil.rmtree(temp_dir, ignore_errors=True)
-                print(f"Cleaned up temp directory: {temp_dir}")
-            except Exception as e:
-                print(f"Cleanup failed for {temp_dir}: {e}")
+        # Hand the transfer to nginx so the worker is freed immediately, nginx serves Range itself.
+        # nginx drops upstream ETags on X-Accel-Redirect and computes its own, so none is sent here.
+        if SENDFILE_BACKEND == 'nginx':
+            internal_path = os.path.relpath(file_path, tempfile.gettempdir())
+            return Response(headers={
+                'X-Accel-Redirect': ACCEL_REDIRECT_PREFIX + quote(internal_path),
+                'Content-Type': mimetype,
+                'Content-Disposition': content_disposition(filename),
+            })
         
-        cleanup_thread = threading.Thread(target=cleanup_later, daemon=True)
-        cleanup_thread.start()
+        # Same video, format and size give the same bytes, so the tag stays valid across re-downloads
+        etag = f"{info.get('id', '')}-{info.get('format_id', '')}-{file_size:x}"
         
-        return send_file(
+        # conditional handles If-None-Match/If-Range and Range for GET, with Accept-Ranges and Content-Length
+        response = send_file(
             file_path,
             as_attachment=True,
             download_name=filename,
-            mimetype=mimetype
+            mimetype=mimetype,
+            conditional=True,
+            etag=etag
         )
+        # The file is read once, don't let it crowd hotter pages out of the page cache
+        evict_after_send(response, file_path)
+        return response
         
     except yt_dlp.DownloadError as e:
         error_msg = str(e)
-        print(f"yt-dlp download error: {error_msg}")
+        logger.warning("yt-dlp download error: %s", error_msg)
         if temp_dir and os.path.exists(temp_dir):
             shutil.rmtree(temp_dir, ignore_errors=True)
         return jsonify({"error": f"Download failed: {error_msg}"}), 400
     except Exception as e:
         error_msg = str(e)
-        print(f"Unexpected download error: {error_msg}")
+        logger.error("Unexpected download error: %s", error_msg)
         if temp_dir and os.path.exists(temp_dir):
             shutil.rmtree(temp_dir, ignore_errors=True)
         return jsonify({"error": f"Server error: {error_msg}"}), 500
@@ -265,44 +694,43 @@ def get_formats():
         if not url:
             return jsonify({"error": "URL is required"}), 400
         
-        ydl_opts = {
-            'quiet': True,
-            'no_warnings': True,
-            'listformats': True,
-        }
+        # Validate URL format
+        if not YOUTUBE_URL_RE.match(url):
+            return jsonify({"error": "Please provide a valid YouTube URL"}), 400
         
-        with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-            info = ydl.extract_info(url, download=False)
-            
-            formats = []
-            seen_formats = set()
+        info = extract_video_info(url)
+        
+        # Dedup similar formats in one pass, reading each field once
+        unique_formats = {}
+        
+        for fmt in info.get('formats', ()):
+            height = fmt.get('height')
+            ext = fmt.get('ext')
+            vcodec = fmt.get('vcodec')
+            kind = 'audio' if vcodec == 'none' else 'video'
             
-            for fmt in info.get('formats', []):
-                # Create a unique identifier for similar formats
-                format_key = (
-                    fmt.get('height'),
-                    fmt.get('ext'),
-                    'video' if fmt.get('vcodec') != 'none' else 'audio'
-                )
-                
-                if format_key not in seen_formats:
-                    seen_formats.add(format_key)
-                    
-                    formats.append({
-                        'format_id': fmt.get('format_id'),
-                        'ext': fmt.get('ext'),
-                        'resolution': fmt.get('resolution', 'audio only' if fmt.get('vcodec') == 'none' else 'unknown'),
-                        'height': fmt.get('height'),
-                        'filesize': fmt.get('filesize'),
-                        'filesize_mb': round(fmt.get('filesize', 0) / 1024 / 1024, 1) if fmt.get('filesize') else None,
-                        'vcodec': fmt.get('vcodec'),
-                        'acodec': fmt.get('acodec'),
-                        'fps': fmt.get('fps'),
-                        'type': 'video' if fmt.get('vcodec') != 'none' else 'audio'
-                    })
+            # Create a unique identifier for similar formats
+            format_key = (height, ext, kind)
+            if format_key in unique_formats:
+                continue
             
+            filesize = fmt.get('filesize')
             # Sort formats by height (video) and put audio formats at the end
-            formats.sort(key=lambda x: (x['type'] == 'audio', -(x['height'] or 0)))
+            sort_key = (kind == 'audio', -(height or 0))
+            unique_formats[format_key] = (sort_key, {
+                'format_id': fmt.get('format_id'),
+                'ext': ext,
+                'resolution': fmt.get('resolution', 'audio only' if kind == 'audio' else 'unknown'),
+                'height': height,
+                'filesize': filesize,
+                'filesize_mb': round(filesize / 1024 / 1024, 1) if filesize else None,
+                'vcodec': vcodec,
+                'acodec': fmt.get('acodec'),
+                'fps': fmt.get('fps'),
+                'type': kind
+            })
+        
+        formats = [entry for _, entry in sorted(unique_formats.values(), key=lambda item: item[0])]
         
         return jsonify({"formats": formats[:20]})  # Limit to 20 formats
         
@@ -316,9 +744,9 @@ if __name__ == '__main__':
     port = int(os.environ.get('PORT', 5000))
     debug = os.environ.get('FLASK_ENV') == 'development'
     
-    print(f"Starting YouTube Downloader API on port {port}")
-    print(f"Max file size: {MAX_FILE_SIZE / 1024 / 1024}MB")
-    print(f"Cleanup interval: {CLEANUP_INTERVAL}s")
+    logger.info("Starting YouTube Downloader API on port %d", port)
+    logger.info("Max file size: %sMB", MAX_FILE_SIZE / 1024 / 1024)
+    logger.info("Cleanup interval: %ds", CLEANUP_INTERVAL)
     
     app.run(host='0.0.0.0', port=port, debug=debug)
 